@@ -1,13 +1,118 @@
 # Reddit Authentication Helper
 # This module handles all the complex authentication for students
 
-import praw
 import os
+from functools import lru_cache
 
-def setup_reddit_connection():
+@lru_cache(maxsize=None)
+def _get_fernet(key):
+    """Build the Fernet cipher once per key"""
+    from cryptography.fernet import Fernet
+    return Fernet(key)
+
+@lru_cache(maxsize=None)
+def decrypt_credential(encrypted_data, key):
+    """Decrypt credentials using Fernet encryption"""
+    try:
+        return _get_fernet(key).decrypt(encrypted_data.encode()).decode()
+    except ImportError:
+        # Silently try fallback method
+        import base64
+        try:
+            return base64.b64decode(encrypted_data).decode()
+        except:
+            return None
+    except Exception:
+        # Silent failure - let calling code handle messaging
+        return None
+
+@lru_cache(maxsize=1)
+def _get_http_session():
+    """
+    Shared HTTP session for PRAW.
+    
+    The connection pool (and its TLS connections) is reused by every Reddit
+    request made from any notebook cell, instead of reconnecting each time.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    ))
+    return session
+
+@lru_cache(maxsize=1)
+def _build_authenticated_reddit(client_id, client_secret, reddit_username, reddit_password, user_agent):
+    """
+    Create an authenticated Reddit instance and check that the login works.
+
+    Cached, so repeated calls from notebook cells reuse the same instance.
+    Raises when authentication fails, and failures are not cached.
+    """
+    # Imported here so importing this module stays cheap
+    import praw
+    
+    reddit = praw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        username=reddit_username,
+        password=reddit_password,
+        user_agent=user_agent,
+        requestor_kwargs={"session": _get_http_session()}
+    )
+
+    # Test authentication
+    reddit.user.me()
+    return reddit
+
+@lru_cache(maxsize=1)
+def _build_read_only_reddit(client_id, client_secret, user_agent):
+    """Create the read-only Reddit instance (no network request needed)."""
+    import praw
+    
+    return praw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        user_agent=user_agent,
+        requestor_kwargs={"session": _get_http_session()}
+    )
+
+def _build_reddit(client_id, client_secret, reddit_username, reddit_password, user_agent):
+    """
+    Create the Reddit instance for one set of credentials.
+
+    A failed login falls back to read-only for this call only, so the next
+    call tries to authenticate again.
+    """
+    if reddit_username and reddit_password:
+        try:
+            reddit = _build_authenticated_reddit(
+                client_id, client_secret, reddit_username, reddit_password, user_agent
+            )
+            return reddit, "authenticated", 600
+        except Exception:
+            # Authentication failed, fall back to read-only
+            pass
+
+    return _build_read_only_reddit(client_id, client_secret, user_agent), "read-only", 60
+
+def verify_connection(reddit):
+    """Test the connection by accessing a public subreddit"""
+    test_subreddit = reddit.subreddit("python")
+    next(test_subreddit.hot(limit=1))
+
+def setup_reddit_connection(verify=False):
     """
     Set up Reddit connection with the best available authentication method.
     
+    Args:
+        verify: If True, fetch one post to check the connection works
+    
     Returns:
         tuple: (reddit_instance, auth_mode, rate_limit)
         - reddit_instance: Configured PRAW Reddit object
@@ -15,23 +120,6 @@ def setup_reddit_connection():
         - rate_limit: Number of requests per minute
     """
     
-    def decrypt_credential(encrypted_data, key):
-        """Decrypt credentials using Fernet encryption"""
-        try:
-            from cryptography.fernet import Fernet
-            f = Fernet(key)
-            return f.decrypt(encrypted_data.encode()).decode()
-        except ImportError:
-            # Silently try fallback method
-            import base64
-            try:
-                return base64.b64decode(encrypted_data).decode()
-            except:
-                return None
-        except Exception:
-            # Silent failure - let calling code handle messaging
-            return None
-
     # Initialize default variables
     reddit_username = None
     reddit_password = None
@@ -72,46 +160,14 @@ def setup_reddit_connection():
             # Error loading config, will use read-only mode
             pass
 
-    # Create Reddit connection
+    # Create (or reuse) the Reddit connection
     try:
-        if reddit_username and reddit_password:
-            # Create authenticated Reddit instance
-            reddit = praw.Reddit(
-                client_id=client_id,
-                client_secret=client_secret,
-                username=reddit_username,
-                password=reddit_password,
-                user_agent=user_agent
-            )
-            
-            # Test authentication
-            try:
-                user = reddit.user.me()
-                auth_mode = "authenticated"
-                rate_limit = 600
-            except Exception:
-                # Authentication failed, fall back to read-only
-                reddit = praw.Reddit(
-                    client_id=client_id,
-                    client_secret=client_secret,
-                    user_agent=user_agent
-                )
-                auth_mode = "read-only"
-                rate_limit = 60
-            
-        else:
-            # Create read-only Reddit instance
-            reddit = praw.Reddit(
-                client_id=client_id,
-                client_secret=client_secret,
-                user_agent=user_agent
-            )
-            auth_mode = "read-only"
-            rate_limit = 60
+        reddit, auth_mode, rate_limit = _build_reddit(
+            client_id, client_secret, reddit_username, reddit_password, user_agent
+        )
         
-        # Test the connection by accessing a public subreddit
-        test_subreddit = reddit.subreddit("python")
-        test_post = next(test_subreddit.hot(limit=1))
+        if verify:
+            verify_connection(reddit)
         
         return reddit, auth_mode, rate_limit
         
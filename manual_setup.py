@@ -6,197 +6,977 @@ A simpler, more relia        print("\n🌍 Downloading GeoNames database...")
         print("📺 You will see the download progress below:") approach that ensures VS Code recognition
 """
 
+import argparse
+import hashlib
 import os
 import sys
 import subprocess
-import venv
 import json
 import platform
+import re
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 
-def setup_nltk_data_in_venv(venv_python):
-    """Download required NLTK data packages using venv python."""
-    print("📚 Setting up NLTK data...")
+# "3.X" of the Python running this script, which the venv is built from
+PY_VERSION = "%d.%d" % sys.version_info[:2]
+
+# Optional pinned, hashed lockfile (pip-compile --generate-hashes output).
+# When present and compiled for this Python version it skips dependency resolution.
+LOCKFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements.lock")
+
+# First line write_lockfile adds to pip-compile lockfiles, which only hold the
+# dependencies of the OS they were resolved on (uv --universal ones cover all)
+LOCK_PLATFORM_LINE = "# ds101: resolved for {system} only\n"
+
+# Operating system name ("Windows", "Darwin", "Linux"), looked up once
+SYSTEM = platform.system()
+
+# User home directory, expanded once
+HOME = os.path.expanduser("~")
+
+# Environment for every pip call: no version-check round trip, never prompt,
+# and one shared download cache so re-runs reuse already fetched wheels
+PIP_ENV = {
+    **os.environ,
+    "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+    "PIP_NO_INPUT": "1",
+    "PIP_CACHE_DIR": os.path.join(HOME, ".cache", "ds101-pip"),
+}
+
+# Oldest pip that understands every install option used below
+MIN_PIP_VERSION = (23, 0)
+
+# Required packages, grouped so that resource downloads can start as soon as
+# the group they need is installed (see the task graph in main)
+PACKAGE_GROUPS = {
+    # NLP packages (Lessons 4-5)
+    "nlp": [
+        "nltk",
+        "spacy",
+        "geoparser",
+    ],
     
-    nltk_script = '''
-import nltk
+    # Machine Learning / Transformers (Lesson 5)
+    "ml": [
+        "transformers",
+        "torch",
+    ],
+    
+    "other": [
+        # Essential Jupyter packages
+        "ipykernel",         # Required for Jupyter kernels
+        "jupyter",
+        "jupyterlab", 
+        "ipywidgets",
+        "notebook",
+        
+        # Basic data science stack
+        "pandas",
+        "numpy",
+        
+        # Interactive visualization
+        "plotly",
+        "mapclassify",
+        
+        # Progress bars
+        "tqdm",
+        
+        # Reddit scraping (Lesson 1)
+        "praw",
+        
+        # Utilities
+        "cryptography",
+        "requests"
+    ],
+}
+
+# .vscode/settings.json pointing VS Code and Jupyter at the venv Python.
+# Same layout json.dumps(indent=4) produced, so existing files compare equal.
+VSCODE_SETTINGS_TEMPLATE = """{{
+    "python.defaultInterpreterPath": "{python}",
+    "python.pythonPath": "{python}",
+    "jupyter.kernels.filter": [
+        {{
+            "path": "{python}",
+            "type": "pythonEnvironment"
+        }}
+    ],
+    "jupyter.interactiveWindow.creationMode": "perFile"
+}}"""
+
+# PyTorch's own index of CPU-only torch wheels (and their dependencies)
+TORCH_CPU_INDEX_URL = "https://download.pytorch.org/whl/cpu"
+
+# Lockfile entries that make up the CUDA build of torch on Linux
+CUDA_TORCH_REQUIREMENT = re.compile(r"(torch|triton|nvidia-[\w-]+|cuda-[\w-]+)\s*==\s*([^\s;\\]+)", re.IGNORECASE)
+
+# Packages (and their compiled dependencies) that must never fall into a
+# multi-minute C++/Rust source build; everything else may use an sdist
+WHEEL_ONLY_PACKAGES = ["torch", "spacy", "cryptography", "transformers", "tokenizers", "safetensors"]
+
+# Written into a wheelhouse once `pip download` has filled it completely, so
+# a fill that failed halfway is finished on the next run
+WHEELHOUSE_MARKER = ".ds101_complete"
+
+# Written into the venv after a fully successful run; lets repeat runs exit
+# immediately, and goes away together with the venv
+STAMP_FILE = ".ds101_stamp"
+
+# Jupyter kernel registered for the venv
+KERNEL_NAME = "ds101-manual"
+KERNEL_DISPLAY_NAME = "Python 3 (DS101 Manual)"
+
+# Held while printing the buffered output of a finished background task, so
+# it comes out in one piece instead of interleaved with other tasks
+OUTPUT_LOCK = threading.Lock()
+
+# Resource setup that runs *inside* the venv. manual_setup.py writes it to
+# ds101_manual/_setup_inside_venv.py and runs it with the task names to do,
+# e.g. `python _setup_inside_venv.py nltk roberta`, so several downloads share
+# one interpreter start-up and run concurrently on a thread pool.
+VENV_SETUP_SCRIPT = '''
+import importlib
+import importlib.util
+import os
+import shutil
 import ssl
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Handle SSL certificate issues
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
-# Download required NLTK data
-packages = [("punkt", "tokenizers/punkt"), ("vader_lexicon", "vader_lexicon")]
-for package, path in packages:
+def setup_nltk():
+    """Download required NLTK data packages."""
+    print("📚 Setting up NLTK data...")
+    import nltk
+    
+    # Handle SSL certificate issues: some Pythons (e.g. python.org builds on
+    # macOS) have no CA certificates. Trust certifi's bundle on top of the
+    # system store (which may hold a school proxy's CA) instead of turning
+    # verification off.
     try:
-        nltk.data.find(path)
-        print(f"✅ NLTK {package} already available")
-    except LookupError:
+        import certifi
+    except ImportError:
+        pass
+    else:
+        def https_context():
+            context = ssl.create_default_context()
+            context.load_verify_locations(certifi.where())
+            return context
+        ssl._create_default_https_context = https_context
+    
+    # Download required NLTK data
+    # punkt is not needed here, lesson 4.1 downloads punkt/punkt_tab itself
+    packages = [("vader_lexicon", "vader_lexicon")]
+    
+    def download(package, path):
+        try:
+            nltk.data.find(path)
+            print(f"✅ NLTK {package} already available")
+            return True
+        except LookupError:
+            pass
         print(f"📥 Downloading NLTK {package}...")
-        nltk.download(package, quiet=True)
-        print(f"✅ NLTK {package} downloaded successfully")
-'''
+        # A Downloader per thread, the shared nltk.download one is not thread-safe
+        ok = nltk.downloader.Downloader().download(package, quiet=True)
+        print(f"✅ NLTK {package} downloaded successfully" if ok
+              else f"⚠️ Failed to download NLTK {package}")
+        return ok
     
-    try:
-        subprocess.check_call([venv_python, "-c", nltk_script])
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to setup NLTK data: {e}")
-        return False
+    with ThreadPoolExecutor(max_workers=len(packages)) as executor:
+        futures = [executor.submit(download, package, path) for package, path in packages]
+        return all(future.result() for future in as_completed(futures))
 
-def setup_roberta_model_in_venv(venv_python):
-    """Pre-download RoBERTa model to avoid classroom delays."""
-    print("\n🤖 Pre-downloading RoBERTa sentiment model...")
-    print("📊 This downloads ~500MB and prevents delays during class")
-    print("📺 You will see the download progress below:")
+def download_spacy_models_one_by_one(models):
+    """Install models with spaCy's download command, which runs pip once per model."""
+    import spacy.cli
     
-    roberta_script = '''
-import os
-import sys
+    ok = True
+    for model_name in models:
+        print(f"📥 Downloading spaCy model: {model_name}...")
+        try:
+            spacy.cli.download(model_name)
+        except (Exception, SystemExit) as e:
+            # spaCy exits through SystemExit when the model or pip fails
+            print(f"⚠️ Failed to download {model_name}: {e}")
+            ok = False
+            continue
+        print(f"✅ {model_name} downloaded successfully")
+    return ok
 
-try:
-    print("🔄 Loading RoBERTa model (this may take a few minutes)...")
-    
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+def setup_spacy():
+    """Download required spaCy language models."""
+    print("🤖 Setting up spaCy models...")
     
-    MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+    # en_core_web_trf is ~440MB and far slower than en_core_web_md on a CPU,
+    # so only fetch it when torch can see a GPU
+    has_cuda = False
+    if importlib.util.find_spec("torch") is not None:
+        import torch
+        has_cuda = torch.cuda.is_available()
     
-    # Download and cache the model components
-    print("📥 Downloading tokenizer...")
-    tokenizer = AutoTokenizer.from_pretrained(MODEL)
+    models = ["en_core_web_sm", "en_core_web_md"] + (["en_core_web_trf"] if has_cuda else [])
+    if not has_cuda:
+        print("💡 No GPU detected - skipping en_core_web_trf, lessons will use en_core_web_md")
     
-    print("📥 Downloading model...")
-    model = AutoModelForSequenceClassification.from_pretrained(MODEL)
+    # Installed models are regular packages, no need to load them to check
+    missing = []
+    for model_name in models:
+        if importlib.util.find_spec(model_name) is None:
+            missing.append(model_name)
+        else:
+            print(f"✅ {model_name} already available")
+    if not missing:
+        return True
     
-    print("✅ RoBERTa model downloaded and cached successfully!")
-    print("💡 Model files are now available for instant loading during lessons")
+    # Resolve the model wheels with spaCy's own helpers, imported in-process
+    # rather than through `python -m spacy`, so spaCy is imported once
+    try:
+        import requests
+        from spacy import about
+        from spacy.cli.download import get_compatibility, get_model_filename, get_version
+        # spaCy exits through SystemExit when the compatibility table is unavailable
+        compatibility = get_compatibility()
+    except (Exception, SystemExit) as e:
+        # These helpers are spaCy internals; its download command still works
+        print(f"⚠️ Could not look up spaCy model wheels ({e}), downloading them one at a time...")
+        return download_spacy_models_one_by_one(missing)
     
-except ImportError as e:
-    print(f"⚠️ Transformers library not available: {e}")
-    print("This is OK - RoBERTa will download when first used")
-    sys.exit(0)
-except Exception as e:
-    print(f"⚠️ Could not pre-download RoBERTa model: {e}")
-    print("This is OK - model will download when first used in lessons")
-    sys.exit(0)
-'''
+    def fetch(model_name, download_dir):
+        print(f"📥 Downloading spaCy model: {model_name}...")
+        try:
+            filename = get_model_filename(model_name, get_version(model_name, compatibility))
+            target = os.path.join(download_dir, filename.split("/")[-1])
+            with requests.get(f"{about.__download_url__}/{filename}", stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(target, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+        except (Exception, SystemExit) as e:
+            print(f"⚠️ Failed to download {model_name}: {e}")
+            return None
+        return target
     
-    try:
-        # Use a longer timeout for model download
-        subprocess.check_call([venv_python, "-c", roberta_script], timeout=900)  # 15 minutes max
-        return True
-    except subprocess.TimeoutExpired:
-        print("⚠️ RoBERTa download timeout - model will download during lessons")
-        return False
-    except subprocess.CalledProcessError as e:
-        print(f"⚠️ RoBERTa pre-download failed: {e}")
-        print("This is OK - model will download when first used")
-        return False
+    # Download the wheels side by side, then install them with a single pip
+    # call: pip processes running at the same time would race on the venv
+    with tempfile.TemporaryDirectory() as download_dir:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            wheels = list(executor.map(fetch, missing, [download_dir] * len(missing)))
+        downloaded = [wheel for wheel in wheels if wheel]
+        if downloaded:
+            print(f"📦 Installing {len(downloaded)} spaCy models...")
+            if subprocess.run([sys.executable, "-m", "pip", "install", *downloaded]).returncode != 0:
+                print("⚠️ Failed to install the spaCy models")
+                return False
+            print("✅ spaCy models installed successfully")
+    return len(downloaded) == len(missing)
 
-def setup_spacy_models_in_venv(venv_python):
-    """Download required spaCy language models using venv python."""
-    print("🤖 Setting up spaCy models...")
-    
-    models = ["en_core_web_sm", "en_core_web_md", "en_core_web_trf"]
-    for model_name in models:
+def load_geonames_gazetteer():
+    """Return geoparser's GeoNames gazetteer object, or None for unknown layouts."""
+    for module_name in ("geoparser.gazetteers", "geoparser.geonames"):
         try:
-            print(f"📥 Downloading spaCy model: {model_name}...")
-            subprocess.check_call([venv_python, "-m", "spacy", "download", model_name])
-            print(f"✅ {model_name} downloaded successfully")
-        except subprocess.CalledProcessError:
-            print(f"⚠️ Failed to download {model_name}")
+            return importlib.import_module(module_name).GeoNames()
+        except Exception:
+            continue
+    return None
 
-def setup_geoparser_in_venv(venv_python):
-    """Setup geoparser and download GeoNames database using venv python."""
-    print("\n🌍 Setting up geoparser...")
+def prefetch_geonames(gazetteer, aria2c):
+    """Download every GeoNames source file at once, so geoparser only has to build the database."""
+    os.makedirs(gazetteer.data_dir, exist_ok=True)
+    urls = [dataset.url for dataset in gazetteer.config.data]
+    if not urls:
+        return
+    targets = [os.path.join(gazetteer.data_dir, url.split("/")[-1]) for url in urls]
     
-    # First check if geoparser is even installed
+    # One aria2c run fetches all files together, each over up to 8 connections
+    print("📥 Downloading with aria2c...")
+    input_list = "".join(f"{url}\\n  out={os.path.basename(target)}.part\\n"
+                         for url, target in zip(urls, targets))
+    subprocess.run([aria2c, "-j", str(len(urls)), "-x", "8", "-s", "8",
+                    "--console-log-level=warn", "-d", gazetteer.data_dir, "-i", "-"],
+                   input=input_list, text=True, check=True)
+    
+    # Only complete files get the name geoparser looks for
+    for target in targets:
+        os.replace(target + ".part", target)
+
+def setup_geo():
+    """Download the GeoNames database for geoparser if it is missing."""
     try:
-        subprocess.run([venv_python, "-c", "import geoparser"], 
-                      check=True, capture_output=True)
-        print("✅ Geoparser package is installed")
-    except subprocess.CalledProcessError:
+        import geoparser
+    except ImportError:
         print("❌ Geoparser not installed - this should have been installed in the previous step")
         print("💡 Try running the script again or install manually: pip install geoparser")
         return False
     
     # Check if GeoNames data is already downloaded
     print("🔍 Checking for existing GeoNames database...")
-    try:
-        result = subprocess.run([venv_python, "-c", 
-                               "import geoparser; gn = geoparser.GeoNames(); print('Data available' if gn.data_dir.exists() else 'No data')"],
-                              capture_output=True, text=True)
-        if "Data available" in result.stdout:
-            print("✅ GeoNames database already available")
-            return True
-        else:
-            print("📥 GeoNames database not found, downloading...")
-    except subprocess.CalledProcessError:
+    gazetteer = load_geonames_gazetteer()
+    if gazetteer is None:
         print("📥 Could not verify existing data, proceeding with download...")
+    elif os.path.exists(gazetteer.db_path):
+        print("✅ GeoNames database already available")
+        return True
+    else:
+        print("📥 GeoNames database not found, downloading...")
     
-    try:
-        print("\n🌍 Downloading GeoNames database...")
-        print("� This downloads ~1GB of geographic data and may take 10-15 minutes")
-        print("📺 You will see the download progress below:")
-        print(f"🔧 Command: {venv_python} -m geoparser download geonames")
-        print("-" * 60)
-        
+    print()
+    print("🌍 Downloading GeoNames database...")
+    print("📊 This downloads ~1GB of geographic data and may take 10-15 minutes")
+    print("📺 You will see the download progress below:")
+    print("-" * 60)
+    
+    returncode = None
+    aria2c = shutil.which("aria2c")
+    if aria2c and gazetteer is not None and hasattr(gazetteer, "config"):
+        # geoparser downloads its source files one by one, loading each
+        # before fetching the next; with aria2c, fetch them all up front
+        # instead (without it, geoparser's own progress bar is worth more). Its
+        # setup_database() skips files that already exist, but starts by
+        # emptying data_dir, so only let the final clean-up through.
+        try:
+            gazetteer.clean_dir()
+            prefetch_geonames(gazetteer, aria2c)
+            clean_dir = gazetteer.clean_dir
+            gazetteer.clean_dir = lambda keep_db=False: keep_db and clean_dir(keep_db=True)
+            gazetteer.setup_database()
+            returncode = 0
+        except Exception as e:
+            # This relies on geoparser internals; if they changed, its own
+            # download command still works
+            print(f"⚠️ Parallel download failed ({e}), using geoparser's own download...")
+    
+    if returncode is None:
         # Show real-time output by not capturing it
-        result = subprocess.run([venv_python, "-m", "geoparser", "download", "geonames"])
-        
-        print("-" * 60)
-        if result.returncode == 0:
-            print("✅ GeoNames database downloaded successfully")
-            return True
-        else:
-            print(f"❌ Geoparser download failed with return code {result.returncode}")
-            return False
-        
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ Failed to download GeoNames database: {e}")
-        print("💡 You can try again later by running:")
-        print(f"   {venv_python} -m geoparser download geonames")
+        returncode = subprocess.run([sys.executable, "-m", "geoparser", "download", "geonames"]).returncode
+    
+    print("-" * 60)
+    if returncode == 0:
+        print("✅ GeoNames database downloaded successfully")
+        return True
+    print(f"❌ Geoparser download failed with return code {returncode}")
+    return False
+
+def setup_roberta():
+    """Pre-download the RoBERTa sentiment model to avoid classroom delays."""
+    print("🤖 Pre-downloading RoBERTa sentiment model...")
+    print("📊 This downloads ~500MB and prevents delays during class")
+    
+    try:
+        from huggingface_hub import snapshot_download
+    except ImportError as e:
+        print(f"⚠️ Hugging Face libraries not available: {e}")
+        print("This is OK - RoBERTa will download when first used")
         return False
-    except KeyboardInterrupt:
-        print("\n🛑 Download cancelled by user")
-        print("💡 You can resume later by running:")
-        print(f"   {venv_python} -m geoparser download geonames")
+    
+    try:
+        # Fetch the tokenizer and PyTorch weights in parallel straight into the
+        # Hugging Face cache, so from_pretrained() loads from disk during lessons
+        snapshot_download(
+            "cardiffnlp/twitter-roberta-base-sentiment",
+            max_workers=8,
+            allow_patterns=["*.json", "*.txt", "pytorch_model.bin",
+                            "tokenizer*", "vocab*", "merges*"],
+        )
+    except Exception as e:
+        print(f"⚠️ Could not pre-download RoBERTa model: {e}")
+        print("This is OK - model will download when first used in lessons")
         return False
+    
+    print("✅ RoBERTa model downloaded and cached successfully!")
+    print("💡 Model files are now available for instant loading during lessons")
+    return True
+
+def setup_kernel():
+    """Register this venv's Python as a Jupyter kernel for the current user."""
+    print(f"🔧 Registering Jupyter kernel: {KERNEL_DISPLAY_NAME}")
+    from ipykernel.kernelspec import install
+    install(user=True, kernel_name=KERNEL_NAME, display_name=KERNEL_DISPLAY_NAME)
+    print("✅ Kernel registered successfully")
+    return True
+
+TASKS = {"nltk": setup_nltk, "spacy": setup_spacy, "geo": setup_geo, "roberta": setup_roberta,
+         "kernel": setup_kernel}
+
+def run(name):
+    try:
+        return TASKS[name]()
+    except Exception as e:
+        print(f"❌ {name} setup failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    names = sys.argv[1:]
+    with ThreadPoolExecutor(max_workers=max(len(names), 1)) as executor:
+        results = list(executor.map(run, names))
+    sys.exit(0 if all(results) else 1)
+'''
+
+def write_venv_setup_script(venv_path):
+    """Write VENV_SETUP_SCRIPT into the venv and return its path."""
+    script_path = os.path.join(venv_path, "_setup_inside_venv.py")
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(f"KERNEL_NAME = {KERNEL_NAME!r}\n")
+        f.write(f"KERNEL_DISPLAY_NAME = {KERNEL_DISPLAY_NAME!r}\n")
+        f.write(VENV_SETUP_SCRIPT)
+    return script_path
+
+def setup_resources_in_venv(venv_python, setup_script, *tasks, timeout=None, buffered=False):
+    """
+    Run resource setup tasks (nltk, spacy, geo, roberta, kernel) in one venv Python process.
+    
+    With buffered=True the output is collected and printed in one block once
+    the process exits, for tasks that run alongside others.
+    """
+    task_list = ", ".join(tasks)
+    # Buffer in a temporary file rather than in memory, progress bars add up
+    output = tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") if buffered else None
+    try:
+        result = subprocess.run([venv_python, setup_script, *tasks], env=PIP_ENV, timeout=timeout,
+                                stdout=output, stderr=subprocess.STDOUT if buffered else None)
+        returncode = result.returncode
+    except subprocess.TimeoutExpired:
+        returncode = None
+    
+    if buffered:
+        with OUTPUT_LOCK, output:
+            print(f"\n📋 Output of {task_list} setup:")
+            output.seek(0)
+            shutil.copyfileobj(output, sys.stdout)
+    
+    if returncode is None:
+        print(f"⚠️ Setup of {task_list} timed out - resources will download when first used")
+    elif returncode != 0:
+        print(f"⚠️ Setup of {task_list} did not fully succeed - see the messages above")
+    return returncode == 0
+
+def setup_geoparser_in_venv(venv_python, venv_path, setup_script):
+    """Setup geoparser and download GeoNames database using venv python."""
+    print("\n🌍 Setting up geoparser...")
+    
+    # A previous run already confirmed the database, skip the probe entirely
+    sentinel_path = os.path.join(venv_path, ".ds101_geonames_ok")
+    if os.path.exists(sentinel_path):
+        print("✅ GeoNames database already available")
+        return True
+    
+    if setup_resources_in_venv(venv_python, setup_script, "geo"):
+        open(sentinel_path, "w").close()
+        return True
+    print("💡 You can try again later by running:")
+    print(f"   {venv_python} -m geoparser download geonames")
+    return False
 
 def check_packages_installed(python_exe, packages):
     """Check if required packages are installed in the environment."""
     print("🔍 Checking existing packages...")
-    missing_packages = []
     
-    for package in packages:
-        try:
-            subprocess.run([python_exe, "-c", f"import {package.replace('-', '_')}"], 
-                         check=True, capture_output=True)
+    # Probe every package in a single venv Python process. Installed
+    # distribution metadata is looked up by pip name, so nothing is imported
+    # and metapackages like jupyter are checked for what pip installed.
+    probe_script = '''
+import importlib.metadata
+import json
+import sys
+
+def installed(name):
+    try:
+        importlib.metadata.version(name)
+        return True
+    except importlib.metadata.PackageNotFoundError:
+        return False
+
+print(json.dumps([installed(name) for name in sys.argv[1:]]))
+'''
+    try:
+        result = subprocess.run([python_exe, "-c", probe_script, *packages],
+                                check=True, capture_output=True, text=True)
+        installed = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, ValueError):
+        # If the probe itself fails, treat everything as missing
+        installed = [False] * len(packages)
+    
+    missing_packages = []
+    for package, is_installed in zip(packages, installed):
+        if is_installed:
             print(f"   ✅ {package} is installed")
-        except subprocess.CalledProcessError:
+        else:
             missing_packages.append(package)
             print(f"   ❌ {package} is missing")
-        except Exception:
-            # For packages with different import names, just try pip show
-            try:
-                result = subprocess.run([python_exe, "-m", "pip", "show", package], 
-                                      check=True, capture_output=True)
-                if result.returncode == 0:
-                    print(f"   ✅ {package} is installed")
-                else:
-                    missing_packages.append(package)
-                    print(f"   ❌ {package} is missing")
-            except:
-                missing_packages.append(package)
-                print(f"   ❌ {package} is missing")
     
     return missing_packages
 
+@lru_cache(maxsize=None)
+def find_executable(name):
+    """shutil.which, searched once per run; PATH does not change while we run."""
+    return shutil.which(name)
+
+def pip_install_command(python_exe, wheels_only=True, index_url=None, force_reinstall=False):
+    """Return the install command prefix, preferring uv when it is on PATH."""
+    uv = find_executable("uv")
+    if uv:
+        # uv resolves and installs in parallel and needs no venv Python startup
+        cmd = [uv, "pip", "install", "--python", python_exe]
+    else:
+        # Bytecode is compiled once for the whole venv, see compile_venv_bytecode
+        cmd = [python_exe, "-m", "pip", "install", "--prefer-binary",
+               "--upgrade-strategy", "only-if-needed", "--no-compile"]
+    
+    # Never fall into a multi-minute sdist build unless explicitly allowed
+    if wheels_only:
+        cmd.append("--only-binary=" + ",".join(WHEEL_ONLY_PACKAGES))
+    if index_url:
+        cmd += ["--index-url", index_url]
+    if force_reinstall:
+        cmd.append("--force-reinstall")
+    return cmd
+
+def ensure_pip_version(python_exe):
+    """Upgrade pip in the venv only when it is older than MIN_PIP_VERSION."""
+    result = subprocess.run([python_exe, "-c", "import pip; print(pip.__version__)"],
+                            capture_output=True, text=True)
+    match = re.match(r"(\d+)\.(\d+)", result.stdout.strip())
+    if match and tuple(map(int, match.groups())) >= MIN_PIP_VERSION:
+        return
+    
+    print("⬆️ Upgrading pip in the virtual environment...")
+    try:
+        subprocess.run([python_exe, "-m", "pip", "install", "--upgrade", "pip"],
+                       check=True, env=PIP_ENV)
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️ Could not upgrade pip (continuing with the bundled version): {e}")
+
+def lockfile_matches_platform(lock_path):
+    """Check that the lockfile exists and was compiled for this Python version and OS."""
+    try:
+        with open(lock_path) as f:
+            header = f.read(500)
+    except OSError:
+        return False
+    
+    # pip-compile writes "... autogenerated by pip-compile with Python 3.X",
+    # uv repeats its "--python-version 3.X" argument in the header
+    match = re.search(r"(?:with Python|--python-version) (\d+\.\d+)", header)
+    if not match or match.group(1) != PY_VERSION:
+        return False
+    
+    # Installed with --no-deps, so a lockfile resolved on another OS would
+    # silently miss that OS's dependencies (colorama, pywinpty, ...)
+    return "--universal" in header or header.startswith(LOCK_PLATFORM_LINE.format(system=SYSTEM))
+
+def write_lockfile(python_exe, lock_path, packages):
+    """Resolve packages once (uv or pip-compile) and write a pinned, hashed lockfile."""
+    uv = find_executable("uv")
+    print(f"\n🔒 Writing {os.path.basename(lock_path)} with {'uv' if uv else 'pip-compile'}...")
+    if uv:
+        # --universal resolves for every OS at once, so one lockfile serves
+        # the whole class
+        compile_cmd = [uv, "pip", "compile", "--quiet", "--universal", "--generate-hashes",
+                       "--python-version", PY_VERSION,
+                       # The header then shows this instead of the command with
+                       # local paths; lockfile_matches_platform reads the flags
+                       "--custom-compile-command",
+                       f"python manual_setup.py --write-lock "
+                       f"(uv pip compile --universal --python-version {PY_VERSION})"]
+    else:
+        try:
+            subprocess.run([*pip_install_command(python_exe), "pip-tools"], check=True, env=PIP_ENV)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Could not install pip-tools: {e}")
+            return False
+        compile_cmd = [python_exe, "-m", "piptools", "compile", "--quiet",
+                       "--resolver=backtracking", "--generate-hashes", "--strip-extras",
+                       "--custom-compile-command", "python manual_setup.py --write-lock"]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        requirements_in = os.path.join(tmp_dir, "requirements.in")
+        with open(requirements_in, "w") as f:
+            f.write("\n".join(packages) + "\n")
+        try:
+            # No "# via" comments: they name the temporary requirements.in
+            subprocess.run([*compile_cmd, "--no-annotate", "--output-file", lock_path, requirements_in],
+                           check=True, env=PIP_ENV)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Resolving the lockfile failed: {e}")
+            return False
+    
+    if not uv:
+        with open(lock_path) as f:
+            lock = f.read()
+        with open(lock_path, "w") as f:
+            f.write(LOCK_PLATFORM_LINE.format(system=SYSTEM) + lock)
+        print(f"💡 This lockfile only works on {SYSTEM}; install uv to write one for every OS")
+    
+    print(f"✅ Lockfile written: {lock_path}")
+    return True
+
+def wants_cpu_torch(gpu):
+    """
+    Decide whether torch should come from the CPU-only index.
+    
+    On Linux the default torch wheel bundles CUDA (~2.5GB); students' laptops
+    only need the ~200MB CPU build. macOS and Windows wheels on PyPI are
+    CPU-only already. An NVIDIA driver (nvidia-smi) means the CUDA build is
+    worth having.
+    """
+    return SYSTEM == "Linux" and not gpu and not find_executable("nvidia-smi")
+
+def installed_torch_is_cpu(python_exe):
+    """Check whether the venv holds the CPU-only torch build (version ends in +cpu)."""
+    result = subprocess.run([python_exe, "-c",
+                             "import importlib.metadata; print(importlib.metadata.version('torch'))"],
+                            capture_output=True, text=True)
+    return result.stdout.strip().endswith("+cpu")
+
+def use_wheelhouse(python_exe, wheelhouse, packages, cpu_torch=False):
+    """
+    Point every install at a local wheel directory instead of PyPI.
+    
+    The first run fills the directory with `pip download`; later runs (or
+    other machines given a copy of it) install entirely from disk.
+    """
+    marker_path = os.path.join(wheelhouse, WHEELHOUSE_MARKER)
+    if not os.path.exists(marker_path):
+        print(f"\n📥 Downloading wheels into {wheelhouse} for future offline runs...")
+        download_cmd = [python_exe, "-m", "pip", "download", "--only-binary=:all:", "-d", wheelhouse]
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                constraints = []
+                if cpu_torch:
+                    # Fetch the CPU torch build first and pin the rest to it, so
+                    # packages depending on torch do not add the CUDA build
+                    subprocess.run([*download_cmd, "--index-url", TORCH_CPU_INDEX_URL, "torch"],
+                                   check=True, env=PIP_ENV)
+                    torch_wheel = next(name for name in os.listdir(wheelhouse)
+                                       if name.startswith("torch-") and name.endswith(".whl"))
+                    constraints_path = os.path.join(tmp_dir, "constraints.txt")
+                    with open(constraints_path, "w") as f:
+                        f.write(f"torch=={torch_wheel.split('-')[1]}\n")
+                    constraints = ["--find-links", wheelhouse, "-c", constraints_path]
+                subprocess.run([*download_cmd, *constraints, *packages], check=True, env=PIP_ENV)
+            open(marker_path, "w").close()
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ Could not fill the wheelhouse ({e}), installing from PyPI instead")
+            return
+    
+    # Both pip and uv read these, so every install command below picks them up
+    print(f"📦 Installing from local wheelhouse: {wheelhouse}")
+    PIP_ENV.update({"PIP_NO_INDEX": "1", "PIP_FIND_LINKS": wheelhouse,
+                    "UV_NO_INDEX": "1", "UV_FIND_LINKS": wheelhouse})
+
+def strip_cuda_torch(lock_path, stripped_path):
+    """
+    Copy the lockfile without torch and its CUDA-only dependencies.
+    
+    Returns the torch version the lockfile pins, or None if it has no torch.
+    """
+    with open(lock_path) as f:
+        lines = f.readlines()
+    
+    torch_version = None
+    skipping = False
+    with open(stripped_path, "w") as f:
+        for line in lines:
+            # A requirement starts at column 0; its hashes and comments are indented
+            if not line[:1].isspace():
+                match = CUDA_TORCH_REQUIREMENT.match(line)
+                skipping = bool(match)
+                if match and match.group(1).lower() == "torch":
+                    torch_version = match.group(2)
+            if not skipping:
+                f.write(line)
+    return torch_version
+
+def install_from_lockfile(python_exe, lock_path, cpu_torch=False):
+    """Install the pinned lockfile without running the dependency resolver."""
+    print(f"\n📦 Installing pinned packages from {os.path.basename(lock_path)}...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The lockfile pins PyPI's (CUDA) torch; install the same version of
+        # the CPU build instead
+        torch_version = None
+        if cpu_torch:
+            stripped_path = os.path.join(tmp_dir, os.path.basename(lock_path))
+            torch_version = strip_cuda_torch(lock_path, stripped_path)
+            lock_path = stripped_path
+        
+        cmd = [*pip_install_command(python_exe), "--no-deps", "--require-hashes", "-r", lock_path]
+        print(f"   Command: {' '.join(cmd)}")
+        try:
+            subprocess.run(cmd, check=True, env=PIP_ENV)
+            if torch_version:
+                print("💡 Installing the CPU-only torch build (use --gpu for CUDA support)")
+                subprocess.run([*pip_install_command(python_exe, index_url=TORCH_CPU_INDEX_URL),
+                                "--no-deps", f"torch=={torch_version}"], check=True, env=PIP_ENV)
+            print("✅ All pinned packages installed successfully")
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ Lockfile install failed ({e}), falling back to regular install...")
+            return False
+
+def run_streamed(cmd):
+    """Run cmd, echoing its output live; return (returncode, last output lines)."""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors="replace", bufsize=1, env=PIP_ENV)
+    tail = deque(maxlen=200)
+    for line in process.stdout:
+        sys.stdout.write(line)
+        tail.append(line)
+    return process.wait(), list(tail)
+
+def find_failed_package(output, packages):
+    """Return the first requested package named in an installer error line."""
+    for line in output:
+        if "error" not in line.lower() and "cause" not in line.lower():
+            continue
+        for package in packages:
+            if re.search(rf"(?<![\w.-]){re.escape(package)}(?![\w.-])", line, re.IGNORECASE):
+                return package
+    return None
+
+def install_packages(python_exe, packages, index_url=None, force_reinstall=False):
+    """Install packages with a single pip call, setting aside any that fail."""
+    install_cmd = pip_install_command(python_exe, index_url=index_url, force_reinstall=force_reinstall)
+    print(f"\n📦 Installing {len(packages)} packages in one batch...")
+    print(f"   Command: {' '.join(install_cmd + packages)}")
+    
+    # One resolver pass for the whole list. When it fails, drop the package
+    # the error names and retry the rest, instead of going one by one.
+    remaining = list(packages)
+    culprits = []
+    while remaining:
+        returncode, output = run_streamed([*install_cmd, *remaining])
+        if returncode == 0:
+            remaining = []
+            break
+        culprit = find_failed_package(output, remaining)
+        if culprit is None:
+            print("⚠️ Batch install failed, retrying packages individually...")
+            break
+        print(f"⚠️ {culprit} could not be installed, retrying the batch without it...")
+        remaining.remove(culprit)
+        culprits.append(culprit)
+    
+    to_retry = culprits + remaining
+    if not to_retry:
+        print("✅ All packages installed successfully")
+        return []
+    return install_packages_individually(python_exe, to_retry, index_url, force_reinstall)
+
+def install_packages_individually(python_exe, packages, index_url=None, force_reinstall=False):
+    """Install packages one at a time, allowing source builds as a last resort."""
+    install_cmd = pip_install_command(python_exe, index_url=index_url, force_reinstall=force_reinstall)
+    source_cmd = pip_install_command(python_exe, wheels_only=False, index_url=index_url,
+                                     force_reinstall=force_reinstall)
+    failed_packages = []
+    for package in packages:
+        print(f"\n📦 Installing {package}...")
+        try:
+            subprocess.run([*install_cmd, package], check=True, env=PIP_ENV)
+            print(f"✅ {package} installed successfully")
+            continue
+        except subprocess.CalledProcessError:
+            # Rare, but some platforms have no wheel for a package
+            print(f"⚠️ No usable wheel for {package}, retrying with source builds allowed...")
+        
+        try:
+            subprocess.run([*source_cmd, package], check=True, env=PIP_ENV)
+            print(f"✅ {package} installed successfully")
+        except subprocess.CalledProcessError as e:
+            failed_packages.append(package)
+            print(f"❌ Failed to install {package}")
+            print(f"💡 You may need to install this manually: {' '.join(source_cmd)} {package}")
+            print(f"Error details: {e}")
+
+    return failed_packages
+
+def compile_venv_bytecode(python_exe, venv_path):
+    """Byte-compile the venv's libraries in one pass using every CPU core."""
+    lib_dir = os.path.join(venv_path, "Lib" if SYSTEM == "Windows" else "lib")
+    print("\n⚙️  Compiling bytecode for installed packages...")
+    result = subprocess.run([python_exe, "-m", "compileall", "-q", "-j", "0", lib_dir],
+                            stdout=subprocess.DEVNULL)
+    # Some packages ship test files that do not compile; that is harmless
+    if result.returncode != 0:
+        print("💡 Some files could not be byte-compiled - they will be compiled on first import")
+    return True
+
+def run_task_graph(tasks, max_workers=4):
+    """
+    Run (name, deps, fn) tasks in a thread pool, starting each task as soon
+    as all of its dependencies have finished. Returns {name: result}.
+    """
+    futures = {}
+    pending = list(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending:
+            ready = [task for task in pending
+                     if all(dep in futures and futures[dep].done() for dep in task[1])]
+            for task in ready:
+                name, deps, fn = task
+                futures[name] = executor.submit(fn)
+                pending.remove(task)
+            
+            running = [future for future in futures.values() if not future.done()]
+            if pending and not ready and not running:
+                raise ValueError(f"Unsatisfiable task dependencies: {[task[0] for task in pending]}")
+            if pending and running:
+                wait(running, return_when=FIRST_COMPLETED)
+    
+    return {name: future.result() for name, future in futures.items()}
+
+def user_kernels_dir():
+    """Return the per-user Jupyter kernels directory used by `ipykernel install --user`."""
+    try:
+        from jupyter_core.paths import jupyter_data_dir
+        return os.path.join(jupyter_data_dir(), "kernels")
+    except ImportError:
+        pass
+    
+    # jupyter_core is not installed in this Python, use its documented defaults
+    if os.environ.get("JUPYTER_DATA_DIR"):
+        return os.path.join(os.environ["JUPYTER_DATA_DIR"], "kernels")
+    if SYSTEM == "Windows":
+        return os.path.join(os.environ.get("APPDATA", HOME), "jupyter", "kernels")
+    elif SYSTEM == "Darwin":
+        return os.path.join(HOME, "Library", "Jupyter", "kernels")
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(HOME, ".local", "share")
+    return os.path.join(data_home, "jupyter", "kernels")
+
+def resolve_venv_python(venv_path):
+    """Return (python_exe, activate_script) for the virtual environment."""
+    if SYSTEM == "Windows":
+        return (os.path.join(venv_path, "Scripts", "python.exe"),
+                os.path.join(venv_path, "Scripts", "activate.bat"))
+    
+    # Unix-like systems (Linux/Mac) - check for both python and python3,
+    # reading the bin directory once instead of stat-ing each candidate
+    bin_dir = os.path.join(venv_path, "bin")
+    try:
+        with os.scandir(bin_dir) as it:
+            entries = {entry.name for entry in it}
+    except OSError:
+        entries = set()
+    has_python = "python" in entries
+    has_python3 = "python3" in entries
+    
+    # Mac prefers python3, Linux prefers python; fall back to the other one
+    if SYSTEM == "Darwin":
+        python_name = "python" if has_python and not has_python3 else "python3"
+    else:
+        python_name = "python3" if has_python3 and not has_python else "python"
+    
+    return os.path.join(bin_dir, python_name), os.path.join(bin_dir, "activate")
+
+def remove_in_background(path):
+    """Move path out of the way and delete it while setup carries on."""
+    trash_path = f"{path}.old.{os.getpid()}"
+    try:
+        os.rename(path, trash_path)
+    except OSError:
+        # e.g. a file is still open on Windows; delete in place instead
+        shutil.rmtree(path)
+        return
+    
+    # Not a daemon thread, so the interpreter waits for it before exiting
+    threading.Thread(target=shutil.rmtree, args=(trash_path,),
+                     kwargs={"ignore_errors": True}).start()
+
+def write_file_atomically(path, content, encoding="utf-8", newline="\n"):
+    """
+    Write content to path via a temporary file and a rename, so an
+    interrupted run never leaves a truncated file behind.
+    """
+    # Encode once and hand the bytes to the BufferedWriter in a single write
+    data = content.replace("\n", newline).encode(encoding)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def setup_stamp_key(packages, cpu_torch):
+    """Hash everything that should trigger a full re-run when it changes."""
+    # The script's own contents cover the model names and setup steps
+    with open(__file__, "rb") as f:
+        script_hash = hashlib.sha256(f.read()).hexdigest()
+    key = {"python": sys.version, "packages": packages, "cpu_torch": cpu_torch,
+           "script": script_hash}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def write_workspace_files(python_exe, activate_script):
+    """
+    Write the VS Code settings and, on Windows, the activation batch file.
+    
+    Cheap, so it runs even when the stamp skips everything else. Returns the
+    batch file path, or None on other systems.
+    """
+    # Step 6: Create VS Code settings
+    print("⚙️  Creating VS Code settings...")
+    
+    # Create .vscode directory
+    vscode_dir = ".vscode"
+    os.makedirs(vscode_dir, exist_ok=True)
+    
+    # Create settings.json; forward slashes work on every OS and need no escaping.
+    # python_exe is already absolute (built from os.getcwd()). Never realpath()
+    # it: the venv's python is a symlink, and resolving it would point VS Code
+    # at the base interpreter outside the venv.
+    settings_path = os.path.join(vscode_dir, "settings.json")
+    new_settings = VSCODE_SETTINGS_TEMPLATE.format(python=python_exe.replace("\\", "/"))
+    
+    # Rewriting an unchanged file still bumps its mtime and makes VS Code
+    # reload the workspace settings, so only write when something changed.
+    # Compare the raw bytes, exactly as write_file_atomically would write them.
+    try:
+        with open(settings_path, "rb") as f:
+            existing_settings = f.read()
+    except FileNotFoundError:
+        existing_settings = None
+    
+    if existing_settings == new_settings.encode("utf-8"):
+        print(f"✅ VS Code settings already up to date: {settings_path}")
+    else:
+        write_file_atomically(settings_path, new_settings)
+        print(f"✅ VS Code settings created at: {settings_path}")
+    
+    # Step 7: Create activation batch file for Windows
+    if SYSTEM == "Windows":
+        batch_content = f'''@echo off
+echo Activating DS101 Environment...
+call "{activate_script}"
+echo  DS101 Environment activated!
+echo  Python: {python_exe}
+echo  To deactivate, type: deactivate
+cmd /k
+'''
+        
+        batch_path = "activate_ds101.bat"
+        # cmd.exe reads batch files in the ANSI code page with CRLF line endings
+        write_file_atomically(batch_path, batch_content, encoding="mbcs", newline="\r\n")
+        
+        print(f"✅ Created activation script: {batch_path}")
+        return batch_path
+    return None
+
 def main():
+    parser = argparse.ArgumentParser(description="Set up the DS101 virtual environment.")
+    parser.add_argument("--force", action="store_true",
+                        help="re-run every step even if a previous run completed")
+    parser.add_argument("--write-lock", action="store_true",
+                        help=f"resolve the packages into {os.path.basename(LOCKFILE)} "
+                             "(commit it so later runs skip dependency resolution)")
+    parser.add_argument("--gpu", action="store_true",
+                        help="install the CUDA build of torch on Linux even when no NVIDIA "
+                             "driver (nvidia-smi) is found")
+    parser.add_argument("--wheelhouse", nargs="?", const="wheelhouse", metavar="DIR",
+                        help="install from wheels cached in DIR (default: ./wheelhouse), "
+                             "downloading them there on the first run")
+    args = parser.parse_args()
+    
     print("Manual DS101 Environment Setup")
     print("=" * 40)
     
@@ -205,6 +985,22 @@ def main():
     venv_name = "ds101_manual"
     venv_path = os.path.join(current_dir, venv_name)
     
+    # Nothing changed since the last successful run: skip all the probes,
+    # installs and downloads
+    packages = [package for group in PACKAGE_GROUPS.values() for package in group]
+    cpu_torch = wants_cpu_torch(args.gpu)
+    stamp_key = setup_stamp_key(packages, cpu_torch)
+    stamp_path = os.path.join(venv_path, STAMP_FILE)
+    if not (args.force or args.write_lock):
+        try:
+            with open(stamp_path) as f:
+                if f.read() == stamp_key:
+                    print("✅ Environment already set up (cached) - run with --force to re-check")
+                    write_workspace_files(*resolve_venv_python(venv_path))
+                    return
+        except OSError:
+            pass
+    
     print(f"Checking virtual environment at: {venv_path}")
     
     # Step 1: Check if environment exists
@@ -213,23 +1009,15 @@ def main():
     if env_exists:
         print("✅ Virtual environment already exists")
         
-        # Get Python executable path for existing environment
-        if platform.system() == "Windows":
-            python_exe = os.path.join(venv_path, "Scripts", "python.exe")
-        else:
-            python_candidate = os.path.join(venv_path, "bin", "python")
-            python3_candidate = os.path.join(venv_path, "bin", "python3")
-            
-            if platform.system() == "Darwin":  # macOS
-                python_exe = python3_candidate if os.path.exists(python3_candidate) else python_candidate
-            else:  # Linux/Ubuntu
-                python_exe = python_candidate if os.path.exists(python_candidate) else python3_candidate
+        python_exe, activate_script = resolve_venv_python(venv_path)
         
-        # Check if Python executable exists and works
+        # Check if Python executable exists and works. Unlike --version this
+        # also runs site start-up, which breaks when the base Python moved.
         try:
-            subprocess.run([python_exe, "--version"], check=True, capture_output=True)
+            subprocess.run([python_exe, "-c", "import sys"], check=True, timeout=30,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             print(f"✅ Python executable working: {python_exe}")
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             print("❌ Python executable not working, recreating environment...")
             env_exists = False
     
@@ -237,89 +1025,32 @@ def main():
         # Remove existing broken environment if it exists
         if os.path.exists(venv_path):
             print("🗑️ Removing broken environment...")
-            import shutil
-            shutil.rmtree(venv_path)
+            remove_in_background(venv_path)
         
-        # Step 2: Create virtual environment
+        # Step 2: Create virtual environment. Imported here because venv pulls
+        # in logging and sysconfig, which a re-run with a working venv never needs.
+        import venv
         print("📦 Creating new virtual environment...")
-        venv.create(venv_path, with_pip=True)
-    
-    # Step 3: Get Python executable path
-    if platform.system() == "Windows":
-        python_exe = os.path.join(venv_path, "Scripts", "python.exe")
-        activate_script = os.path.join(venv_path, "Scripts", "activate.bat")
-    else:
-        # Unix-like systems (Linux/Mac) - check for both python and python3
-        python_candidate = os.path.join(venv_path, "bin", "python")
-        python3_candidate = os.path.join(venv_path, "bin", "python3")
-        
-        # Platform-specific preference order
-        if platform.system() == "Darwin":  # macOS
-            # Mac prefers python3, fallback to python
-            if os.path.exists(python3_candidate):
-                python_exe = python3_candidate
-            elif os.path.exists(python_candidate):
-                python_exe = python_candidate
-            else:
-                python_exe = python3_candidate  # Fallback
-        else:  # Linux/Ubuntu
-            # Linux prefers python, fallback to python3
-            if os.path.exists(python_candidate):
-                python_exe = python_candidate
-            elif os.path.exists(python3_candidate):
-                python_exe = python3_candidate
-            else:
-                python_exe = python_candidate  # Fallback
+        # Symlink the interpreter where supported and keep the bundled pip;
+        # it is only upgraded below if it is too old
+        builder = venv.EnvBuilder(with_pip=True, symlinks=(os.name != "nt"))
+        builder.create(venv_path)
         
-        activate_script = os.path.join(venv_path, "bin", "activate")
+        # Step 3: Get Python executable path
+        python_exe, activate_script = resolve_venv_python(venv_path)
     
     print(f"🐍 Python executable: {python_exe}")
     
-    # Step 4: Install essential packages (complete list from simple_setup.py)
-    packages = [
-        # Essential Jupyter packages first
-        "ipykernel",         # Required for Jupyter kernels
-        "jupyter",
-        "jupyterlab", 
-        "ipywidgets",
-        "notebook",
-        
-        # Basic data science stack
-        "pandas",
-        "numpy",
-        
-        
-        # Interactive visualization
-        "plotly",
-        "mapclassify",
-        
-        # Progress bars
-        "tqdm",
-        
-        # Reddit scraping (Lesson 1)
-        "praw",
-        
-        # NLP packages (Lessons 4-5)
-        "nltk",
-        "spacy",
-        "geoparser",
-        
-        # Machine Learning / Transformers (Lesson 5)
-        "transformers",
-        "torch",
-        
-        
-
-        # Utilities
-        "cryptography",
-        "requests"
-    ]
+    if not find_executable("uv"):
+        ensure_pip_version(python_exe)
     
+    # Step 4: Install essential packages
     # Check which packages are missing
     if env_exists:
         missing_packages = check_packages_installed(python_exe, packages)
         if not missing_packages:
             print("✅ All required packages are already installed!")
+            packages_to_install = []
         else:
             print(f"📦 Installing {len(missing_packages)} missing packages...")
             packages_to_install = missing_packages
@@ -327,137 +1058,153 @@ def main():
         print("📦 Installing all packages in new environment...")
         packages_to_install = packages
     
-    # Install only missing packages with real-time output
-    for package in packages_to_install:
-        print(f"\n📦 Installing {package}...")
-        print(f"   Command: {python_exe} -m pip install {package}")
-        
-        try:
-            # Show real-time output by not capturing it
-            result = subprocess.run([python_exe, "-m", "pip", "install", package], 
-                                  check=True)
-            print(f"✅ {package} installed successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Failed to install {package}")
-            print(f"💡 You may need to install this manually: {python_exe} -m pip install {package}")
-            print(f"Error details: {e}")
+    # The CPU-only torch satisfies the package probe, so switching to the
+    # CUDA build (--gpu, or a newly found NVIDIA driver) needs a reinstall
+    reinstall_torch = (env_exists and not cpu_torch and "torch" not in packages_to_install
+                       and installed_torch_is_cpu(python_exe))
+    if reinstall_torch:
+        packages_to_install = packages_to_install + ["torch"]
     
-    # Step 5: Register Jupyter kernel
-    kernel_name = "ds101-manual"
-    display_name = "Python 3 (DS101 Manual)"
+    if args.wheelhouse:
+        wheelhouse = os.path.abspath(args.wheelhouse)
+        os.makedirs(wheelhouse, exist_ok=True)
+        use_wheelhouse(python_exe, wheelhouse, packages, cpu_torch)
     
-    # Check if kernel already exists
-    try:
-        result = subprocess.run([python_exe, "-m", "jupyter", "kernelspec", "list"], 
-                              capture_output=True, text=True)
-        if kernel_name in result.stdout:
-            print(f"✅ Jupyter kernel '{display_name}' already exists")
-        else:
-            print(f"🔧 Registering Jupyter kernel: {display_name}")
-            subprocess.run([
-                python_exe, "-m", "ipykernel", "install",
-                "--user",
-                "--name", kernel_name,
-                "--display-name", display_name
-            ], check=True, capture_output=True)
-            print("✅ Kernel registered successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"⚠️ Could not check/register kernel (this is usually OK): {e}")
-        # Try to register anyway
-        try:
-            subprocess.run([
-                python_exe, "-m", "ipykernel", "install",
-                "--user",
-                "--name", kernel_name,
-                "--display-name", display_name
-            ], check=True, capture_output=True)
-            print("✅ Kernel registered successfully")
-        except subprocess.CalledProcessError as e2:
-            print(f"❌ Failed to register kernel: {e2}")
-    
-    # Step 5.5: Setup NLP resources
-    print("\n📚 Setting up NLP resources...")
-    setup_nltk_data_in_venv(python_exe)
-    setup_spacy_models_in_venv(python_exe)
-    setup_geoparser_in_venv(python_exe)
-    
-    # Step 5.6: Pre-download RoBERTa model for sentiment analysis
-    setup_roberta_model_in_venv(python_exe)
+    if args.write_lock:
+        write_lockfile(python_exe, LOCKFILE, packages)
+        packages_to_install = packages
     
-    # Step 6: Create VS Code settings
-    print("⚙️  Creating VS Code settings...")
+    # Install only missing packages with real-time output. Lockfile installs
+    # clear `missing` but still leave bytecode to compile, so remember this too.
+    missing = set(packages_to_install)
+    installing = bool(missing)
+    if missing and lockfile_matches_platform(LOCKFILE) and install_from_lockfile(python_exe, LOCKFILE, cpu_torch):
+        # The lockfile may predate a package added to PACKAGE_GROUPS; the
+        # group installs below pick up whatever it did not cover
+        missing = set(check_packages_installed(python_exe, packages))
+        # The lockfile's torch pin is satisfied by the CPU build, too
+        if reinstall_torch:
+            missing.add("torch")
     
-    # Create .vscode directory
-    vscode_dir = ".vscode"
-    os.makedirs(vscode_dir, exist_ok=True)
+    def install_torch():
+        # Runs before every group: geoparser (nlp) and transformers (ml) depend
+        # on torch, and would otherwise pull the CUDA build from PyPI first
+        if "torch" not in missing or not (cpu_torch or reinstall_torch):
+            return []
+        if cpu_torch:
+            print("💡 Installing the CPU-only torch build (use --gpu for CUDA support)")
+            return install_packages(python_exe, ["torch"], index_url=TORCH_CPU_INDEX_URL)
+        print("💡 Replacing the CPU-only torch build with the CUDA build")
+        return install_packages(python_exe, ["torch"], force_reinstall=True)
     
-    # Create settings.json
-    settings = {
-        "python.defaultInterpreterPath": python_exe.replace("\\\\", "/"),
-        "python.pythonPath": python_exe.replace("\\\\", "/"),
-        "jupyter.kernels.filter": [
-            {
-                "path": python_exe.replace("\\\\", "/"),
-                "type": "pythonEnvironment"
-            }
-        ],
-        "jupyter.interactiveWindow.creationMode": "perFile"
-    }
+    def install_group(group):
+        group_packages = [p for p in PACKAGE_GROUPS[group]
+                          if p in missing and not (p == "torch" and (cpu_torch or reinstall_torch))]
+        if not group_packages:
+            return []
+        return install_packages(python_exe, group_packages)
     
-    settings_path = os.path.join(vscode_dir, "settings.json")
-    with open(settings_path, "w") as f:
-        json.dump(settings, f, indent=4)
+    # Step 4.5: Download NLP resources and the RoBERTa model as soon as the
+    # packages they need are installed, overlapping the remaining installs.
+    # Installs are chained so only one pip process touches the venv at a time;
+    # the spaCy models are installed with pip, so that step waits for all of them.
+    # GeoNames (~1GB, the slowest step) streams its progress live; the other
+    # downloads print their output once they finish.
+    print("\n📚 Installing packages and setting up NLP resources...")
+    setup_script = write_venv_setup_script(venv_path)
     
-    print(f"✅ VS Code settings created at: {settings_path}")
+    # Step 5: Register the Jupyter kernel in the same venv Python process as
+    # the spaCy downloads. Check for its kernelspec directory first, instead
+    # of starting Jupyter just to list the kernels.
+    final_tasks = ["spacy"]
+    if os.path.isdir(os.path.join(user_kernels_dir(), KERNEL_NAME)):
+        print(f"✅ Jupyter kernel '{KERNEL_DISPLAY_NAME}' already exists")
+    else:
+        final_tasks.append("kernel")
     
-    # Step 7: Create activation batch file for Windows
-    if platform.system() == "Windows":
-        batch_content = f'''@echo off
-echo Activating DS101 Environment...
-call "{activate_script}"
-echo  DS101 Environment activated!
-echo  Python: {python_exe}
-echo  To deactivate, type: deactivate
-cmd /k
-'''
-        
-        batch_path = "activate_ds101.bat"
-        with open(batch_path, "w") as f:
-            f.write(batch_content)
-        
-        print(f"✅ Created activation script: {batch_path}")
+    try:
+        results = run_task_graph([
+            ("torch", [], install_torch),
+            ("nlp_packages", ["torch"], lambda: install_group("nlp")),
+            ("ml_packages", ["nlp_packages"], lambda: install_group("ml")),
+            ("nltk_and_roberta", ["ml_packages"],
+             lambda: setup_resources_in_venv(python_exe, setup_script, "nltk", "roberta",
+                                             timeout=900, buffered=True)),
+            ("other_packages", ["ml_packages"], lambda: install_group("other")),
+            ("spacy_models_and_kernel", ["other_packages"],
+             lambda: setup_resources_in_venv(python_exe, setup_script, *final_tasks, buffered=True)),
+            ("geonames", ["other_packages"],
+             lambda: setup_geoparser_in_venv(python_exe, venv_path, setup_script)),
+            ("bytecode", ["other_packages"],
+             lambda: installing and compile_venv_bytecode(python_exe, venv_path)),
+        ])
+    except KeyboardInterrupt:
+        print("\n🛑 Setup cancelled by user")
+        print("💡 Run this script again to pick up where it left off")
+        return
+    failed_packages = (results["torch"] + results["nlp_packages"] + results["ml_packages"]
+                       + results["other_packages"])
+    failed_steps = [label for name, label in (("nltk_and_roberta", "NLTK data / RoBERTa model"),
+                                              ("spacy_models_and_kernel", "spaCy models / Jupyter kernel"),
+                                              ("geonames", "GeoNames database"))
+                    if not results[name]]
+    
+    batch_path = write_workspace_files(python_exe, activate_script)
     
-    # Final instructions
-    print("\\n" + "=" * 50)
-    print(" Manual Setup Complete!")
-    print("=" * 50)
-    
-    print("\\n Next Steps:")
-    print("1. **Restart VS Code completely**")
-    print("2. Reopen this folder in VS Code")
-    print("3. Open a .ipynb file")
-    print("4. Click on the kernel selector (top right)")
-    print(f"5. Look for: '{display_name}'")
-    print("6. If not visible, click 'Select Another Kernel...'")
-    print("7. Choose 'Python Environments'")
-    print(f"8. Select the path: {python_exe}")
-    
-    print("\\n🔧 Alternative Method:")
-    print("1. Press Ctrl+Shift+P")
-    print("2. Type: 'Python: Select Interpreter'")
-    print(f"3. Choose: {python_exe}")
-    
-    if platform.system() == "Windows":
-        print("\\n Terminal Usage:")
-        print(f"• Double-click: {batch_path}")
-        print("• Or manually activate with:")
-        print(f"  {activate_script}")
-    
-    print("\\n Environment Details:")
-    print(f"• Name: {kernel_name}")
-    print(f"• Path: {venv_path}")
-    print(f"• Python: {python_exe}")
-    print(f"• Kernel: {display_name}")
+    # Only a run where every package installed and the resources the lessons
+    # cannot work without are in place may skip future runs. The NLTK data and
+    # RoBERTa model are left out: lesson 5 downloads them on first use anyway.
+    if not failed_packages and results["spacy_models_and_kernel"] and results["geonames"]:
+        write_file_atomically(stamp_path, stamp_key)
+    
+    # Final instructions, collected and written in one go
+    parts = [f"""
+{"=" * 50}
+ Manual Setup Complete!
+{"=" * 50}
+"""]
+    if failed_packages:
+        parts.append(f"""
+⚠️  Some packages could not be installed: {', '.join(failed_packages)}
+   Run this script again, or install them manually (see the messages above)
+""")
+    if failed_steps:
+        parts.append(f"""
+⚠️  Some setup steps did not complete: {', '.join(failed_steps)}
+   Run this script again to retry them (see the messages above)
+""")
+    parts.append(f"""
+ Next Steps:
+1. **Restart VS Code completely**
+2. Reopen this folder in VS Code
+3. Open a .ipynb file
+4. Click on the kernel selector (top right)
+5. Look for: '{KERNEL_DISPLAY_NAME}'
+6. If not visible, click 'Select Another Kernel...'
+7. Choose 'Python Environments'
+8. Select the path: {python_exe}
+
+🔧 Alternative Method:
+1. Press Ctrl+Shift+P
+2. Type: 'Python: Select Interpreter'
+3. Choose: {python_exe}
+""")
+    if SYSTEM == "Windows":
+        parts.append(f"""
+ Terminal Usage:
+• Double-click: {batch_path}
+• Or manually activate with:
+  {activate_script}
+""")
+    parts.append(f"""
+ Environment Details:
+• Name: {KERNEL_NAME}
+• Path: {venv_path}
+• Python: {python_exe}
+• Kernel: {KERNEL_DISPLAY_NAME}
+""")
+    sys.stdout.write("".join(parts))
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file